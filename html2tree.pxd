@@ -0,0 +1,30 @@
+# Augmenting declarations for compiling html2tree.py with Cython, attributes
+# are public so that they stay accessible from Python code.
+
+cdef class HTMLNode:
+    cdef public str tag
+    cdef public int level
+    cdef public bint closed
+
+
+cdef class TagNode(HTMLNode):
+    cdef public dict attrs
+    cdef public list children
+
+    cpdef add_child(self, new_child)
+    cpdef self_close(self)
+    cpdef close(self, closing_tag)
+
+
+cdef class DataNode(HTMLNode):
+    cdef public str data
+
+
+cdef class HTMLTree:
+    cdef public TagNode root
+    cdef public TagNode pointer
+    cdef public list path
+
+    cpdef add_node(self, node)
+    cpdef add_data(self, data_node)
+    cpdef close_node(self, closing_tag)
@@ -1,11 +1,120 @@
+# cython: language_level=3
 """Construct a structured HTML tree from raw HTML text, 
 Remove tag nodes with specific name or specific attributes."""
 import re
-from queue import LifoQueue
+import sys
 from html.parser import HTMLParser
 
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import cython
+except ImportError:
+    class cython(object):
+        """Minimal stand-in of Cython's pure Python mode, used when Cython is 
+        not installed so that the module runs as plain Python.
+        """
+        compiled = False
+        int = int
+        bint = bool
+
+        @staticmethod
+        def cclass(obj):
+            return obj
+
+        ccall = cfunc = cclass
+
+
+# node types stored in HTMLTreeParser.types
+_STARTTAG = 'starttag'
+_ENDTAG = 'endtag'
+_DATA = 'data'
+
+SELF_CLOSING_TAGS = frozenset(['img', 'area', 'base', 'br', 'col', 'command', 'embed',
+                               'hr', 'input', 'keygen', 'link', 'menuitem', 'meta', 'param', 'source', 'wbr'])
+DEFAULT_TAGS_DELETE = frozenset(['script', 'noscript', 'style', 'aside',
+                                 'header', 'footer', 'nav', 'navigation'])
+DEFAULT_ATTRS_DELETE = frozenset(['menu', 'head', 'header', 'footer', 'foot', 'nav', 'navigation'])
+# attributes whose values are split into sets of words
+SPLIT_ATTRS = frozenset(['id', 'class'])
+
+# spaces after '<', and backslashes escaping '/' or '"', all removed in a single pass
+_PREPROC = re.compile(r'(?<=<) +|\\(?=[/"])')
+# runs of whitespace collapsed in pure text
+_WS = re.compile(r'\s+')
+
+# indentation prefixes of the common levels, built once
+_TABS = tuple('\t'*i for i in range(64))
+
+
+def _indent(level):
+    """Get the indentation prefix of a node at the given level.
+    """
+    return _TABS[level] if level < 64 else '\t'*level
+
 
-class HTMLTreeParser(HTMLParser):
+class BaseParser(HTMLParser):
+    """HTML parser tokenizing with selectolax's lexbor backend on demand, 
+    super class of the parsers in this module, which only implement the handlers.
+
+    Attributes
+    ----------
+    use_lexbor : boolean, default False
+        Whether the HTML text is tokenized by selectolax's lexbor backend instead of the 
+        standard library parser. It's only possible when selectolax is installed.
+    lexbor_chunks : list of str
+        The chunks of HTML text fed so far, parsed at once by lexbor when the parser is closed.
+    """
+
+    def __init__(self, use_lexbor=False):
+        HTMLParser.__init__(self)
+        self.use_lexbor = use_lexbor and LexborHTMLParser is not None
+        self.lexbor_chunks = []
+
+    def feed(self, data):
+        """Feed the HTML text to the parser. With lexbor backend, the text is only 
+        buffered, the whole document is parsed when the parser is closed.
+        """
+        if self.use_lexbor:
+            self.lexbor_chunks.append(data)
+        else:
+            HTMLParser.feed(self, data)
+
+    def close(self):
+        """Parse the buffered HTML text with lexbor backend if used, then close the parser.
+        """
+        if self.use_lexbor:
+            data = ''.join(self.lexbor_chunks)
+            self.lexbor_chunks = []
+            self.feed_lexbor(data)
+        HTMLParser.close(self)
+
+    def feed_lexbor(self, data):
+        """Tokenize the HTML text with selectolax's lexbor parser, then walk the 
+        resulting node tree in preorder and call the same handlers as the 
+        standard library parser does.
+        """
+        stack = [LexborHTMLParser(data).root]
+        while stack:
+            node = stack.pop()
+            # a str in the stack marks the end of a tag node
+            if isinstance(node, str):
+                self.handle_endtag(node)
+                continue
+            tag = node.tag
+            if tag == '-text':
+                self.handle_data(node.text(deep=False))
+            elif not tag.startswith('-'):
+                # comments and other special nodes are ignored
+                self.handle_starttag(tag, node.attributes)
+                stack.append(tag)
+                stack.extend(reversed(list(node.iter(include_text=True))))
+
+
+class HTMLTreeParser(BaseParser):
     """Find nodes (tags or data) from an HTML text and transform into a list of 
     node contents (tag names or data) content and a list of node types (start 
     tag, end tag, data, etc).
@@ -17,25 +126,23 @@ class HTMLTreeParser(HTMLParser):
     types : list of str
         The list of node types, like `starttag`, `endtag`, `data`.
     """
-    members = []
-    types = []
 
-    def __init__(self):
-        HTMLParser.__init__(self)
+    def __init__(self, use_lexbor=False):
+        super().__init__(use_lexbor)
         self.members = []
         self.types = []
 
     def handle_starttag(self, tag, attrs):
         """Handler function of start tag node, append (tagname, attrs) to self.members and 'starttag' to self.types.
         """
-        self.members.append((tag, attrs))
-        self.types.append('starttag')
+        self.members.append((sys.intern(tag), attrs))
+        self.types.append(_STARTTAG)
 
     def handle_endtag(self, tag):
         """Handler function of end tag node, append tagname to self.members and 'endtag' to self.types.
         """
-        self.members.append(tag)
-        self.types.append('endtag')
+        self.members.append(sys.intern(tag))
+        self.types.append(_ENDTAG)
 
     def handle_data(self, data):
         """Handler function of data node, append data content to self.members and 'data' to self.types.
@@ -43,7 +150,7 @@ class HTMLTreeParser(HTMLParser):
         data_stripped = data.strip()
         if data_stripped:
             self.members.append(data_stripped)
-            self.types.append('data')
+            self.types.append(_DATA)
 
     def handle_comment(self, data):
         # print("Comment  :", data)
@@ -67,6 +174,109 @@ class HTMLTreeParser(HTMLParser):
         pass
 
 
+class TreeBuildingParser(BaseParser):
+    """Build an HTML tree directly from the parser handlers, without buffering 
+    the nodes in intermediate lists.
+
+    Attributes
+    ----------
+    tree : HTMLTree object
+        The HTML tree under construction.
+    """
+
+    def __init__(self, use_lexbor=False):
+        super().__init__(use_lexbor)
+        self.tree = HTMLTree()
+
+    def handle_starttag(self, tag, attrs):
+        """Handler function of start tag node, add a tag node to the tree and close it at once if it's a self-closed tag.
+        """
+        # interned tag names make set lookups and end tag matching mostly hit the identity fast path
+        tag = sys.intern(tag)
+        self.tree.add_node(TagNode(tag, attrs=attrs))
+        if tag in SELF_CLOSING_TAGS:
+            self.tree.self_close()
+
+    def handle_endtag(self, tag):
+        """Handler function of end tag node, close the node under operation unless it's a self-closed tag.
+        """
+        tag = sys.intern(tag)
+        if tag not in SELF_CLOSING_TAGS:
+            self.tree.close_node(tag)
+
+    def handle_data(self, data):
+        """Handler function of data node, add a data node to the tree if data is not blank.
+        """
+        data_stripped = data.strip()
+        if data_stripped:
+            self.tree.add_data(DataNode(data=data_stripped))
+
+
+class TextParser(BaseParser):
+    """Collect the pure text of an HTML text directly from the parser handlers, 
+    skipping the data inside nodes to be deleted, without building any tree.
+
+    Attributes
+    ----------
+    parts : list of str
+        The stripped data contents kept so far.
+    path : list of str
+        The tags of the nodes opened and not closed yet, used as a stack.
+    skip_depth : int
+        The length of the path when the outermost node to be deleted was opened, 0 when not in such a node.
+    tags_delete : frozenset of str
+        The tags of nodes to be deleted.
+    attrs_delete : frozenset of str
+        The `id` or `class` attribute values of nodes to be deleted.
+    """
+
+    def __init__(self, tags_delete=DEFAULT_TAGS_DELETE, attrs_delete=DEFAULT_ATTRS_DELETE, use_lexbor=False):
+        super().__init__(use_lexbor)
+        self.parts = []
+        self.path = []
+        self.skip_depth = 0
+        self.tags_delete = frozenset(tags_delete)
+        self.attrs_delete = frozenset(attrs_delete)
+
+    def handle_starttag(self, tag, attrs):
+        """Handler function of start tag node, add the tag to the path and start skipping if the node is to be deleted.
+        """
+        if tag in SELF_CLOSING_TAGS:
+            return
+        self.path.append(tag)
+        if self.skip_depth:
+            return
+        if tag in self.tags_delete:
+            self.skip_depth = len(self.path)
+            return
+        items = attrs.items() if hasattr(attrs, 'items') else attrs
+        for attr, attr_v in items:
+            if attr in SPLIT_ATTRS and attr_v and not self.attrs_delete.isdisjoint(attr_v.split()):
+                self.skip_depth = len(self.path)
+                break
+
+    def handle_endtag(self, tag):
+        """Handler function of end tag node, remove the tag from the path and stop skipping when the node to be deleted is closed.
+        If end tag doesn't match, raise an exception as the tree does.
+        """
+        if tag in SELF_CLOSING_TAGS:
+            return
+        if not self.path or self.path[-1] != tag:
+            raise Exception("Closing tag doesn't match starting tag.")
+        self.path.pop()
+        if len(self.path) < self.skip_depth:
+            self.skip_depth = 0
+
+    def handle_data(self, data):
+        """Handler function of data node, keep the data if not blank and not in a node to be deleted.
+        """
+        if not self.skip_depth:
+            data_stripped = data.strip()
+            if data_stripped:
+                self.parts.append(data_stripped)
+
+
+@cython.cclass
 class HTMLNode(object):
     """Nodes of HTML tree, super class of TagNode and DataNode.
 
@@ -79,6 +289,10 @@ class HTMLNode(object):
     closed : boolean, default False
         A tag node is closed when it has an correspondent end tag. A data node is always closed (always True).
     """
+    __slots__ = ('tag', 'level', 'closed')
+    tag: str
+    level: cython.int
+    closed: cython.bint
 
     def __init__(self, tag, level=0):
         self.tag = tag
@@ -86,6 +300,7 @@ class HTMLNode(object):
         self.closed = False
 
 
+@cython.cclass
 class TagNode(HTMLNode):
     """Tag node of HTML tree, inherited from HTMLNode class.
 
@@ -94,7 +309,8 @@ class TagNode(HTMLNode):
     tag : str
         The tag name of the node.
     attrs : dict
-        The dict of attributes and their values of the node.
+        The dict of attributes and their values of the node. The values of `id` and `class` are 
+        split into sets of str, the values of other attributes are kept as they are.
     level : int, default 0
         The level of node in HTML tree. The root node has level 0.
     children : list of HTMLNode objects
@@ -102,22 +318,36 @@ class TagNode(HTMLNode):
     closed : boolean, default False
         A tag node is closed when it has an correspondent end tag.
     """
+    __slots__ = ('attrs', 'children')
+    attrs: dict
+    children: list
 
     def __init__(self, tag, attrs=dict(), level=0):
         super().__init__(tag, level)
-        self.attrs = {attr: set(attr_v.split()) for attr, attr_v in attrs}
+        self.attrs = {}
+        # attrs is a list of (name, value) pairs from html.parser, or a mapping from lexbor
+        items = attrs.items() if hasattr(attrs, 'items') else attrs
+        for attr, attr_v in items:
+            # only `id` and `class` values are inspected by clean, don't split the others
+            if attr in SPLIT_ATTRS:
+                self.attrs[attr] = set(attr_v.split()) if attr_v else set()
+            else:
+                self.attrs[attr] = attr_v
         self.children = []
 
+    @cython.ccall
     def add_child(self, new_child):
         """Add a child node. Append the new child node to self.children.
         """
         self.children.append(new_child)
 
+    @cython.ccall
     def self_close(self):
         """Close the node with brute force for some self-closed tags.
         """
         self.closed = True
 
+    @cython.ccall
     def close(self, closing_tag):
         """Close the node if correspondent end tag found. If end tag doesn't match, raise an exception.
         """
@@ -126,37 +356,85 @@ class TagNode(HTMLNode):
         else:
             raise Exception("Closing tag doesn't match starting tag.")
 
-    def clean(self,
-              tags_delete=['script', 'noscript', 'style', 'aside',
-                           'header', 'footer', 'nav', 'navigation'],
-              attrs_delete=['menu', 'head', 'header', 'footer', 'foot', 'nav', 'navigation']):
-        """Clean the node and its children nodes recursively if it's tag is to be deleted, or if it has an attribute value to be deleted.
+    def clean(self, tags_delete=DEFAULT_TAGS_DELETE, attrs_delete=DEFAULT_ATTRS_DELETE):
+        """Clean the node and its children nodes if it's tag is to be deleted, or if it has an attribute value to be deleted.
+        The subtree is walked iteratively with an explicit stack, so deep trees don't hit the recursion limit.
         """
-        if self.tag in tags_delete:
-            return None
-        elif (self.attrs.get('id', set()) | self.attrs.get('class', set())) & set(attrs_delete):
+        if self.to_delete(tags_delete, attrs_delete):
             return None
-        self.children = [c.clean(tags_delete, attrs_delete)
-                         for c in self.children]
-        self.children = [c for c in self.children if c]
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            # filter the children and push the kept tag nodes in a single pass
+            children = []
+            for c in node.children:
+                if isinstance(c, DataNode):
+                    children.append(c)
+                elif not c.to_delete(tags_delete, attrs_delete):
+                    children.append(c)
+                    stack.append(c)
+            node.children = children
         return self
 
+    def to_delete(self, tags_delete, attrs_delete):
+        """Check if the node is to be deleted because of its tag or one of its `id` or `class` attribute values.
+        """
+        if self.tag in tags_delete:
+            return True
+        ids = self.attrs.get('id')
+        classes = self.attrs.get('class')
+        return bool((ids and not ids.isdisjoint(attrs_delete)) or
+                    (classes and not classes.isdisjoint(attrs_delete)))
+
     def pure_text(self):
         """Get pure text content of the node, including the pure text of its children nodes.
+        The data nodes are collected in preorder with an explicit stack and joined once.
         """
-        s = ' '.join([c.pure_text() for c in self.children])
-        return s
+        parts = []
+        stack = list(reversed(self.children))
+        while stack:
+            node = stack.pop()
+            if isinstance(node, DataNode):
+                parts.append(node.data)
+            else:
+                stack.extend(reversed(node.children))
+        return ' '.join(parts)
+
+    def _header(self):
+        """Get the line of the node itself, without indentation nor children nodes.
+        """
+        if not self.attrs:
+            return "<" + self.tag + "> : "
+        attrs = []
+        for attr, attr_v in self.attrs.items():
+            if attr_v is None:
+                # attribute without value
+                value = ''
+            elif isinstance(attr_v, str):
+                value = attr_v
+            else:
+                # set of `id` or `class` values
+                value = ' '.join(attr_v)
+            attrs.append(attr + ' = "' + value + '"')
+        return "<" + self.tag + "> : " + ' | '.join(attrs)
 
     def __str__(self):
-        s = '\t'*self.level + "<" + self.tag + "> : "
-        s += ' | '.join([attr+' = "'+' '.join(attr_v) +
-                         '"' for attr, attr_v in self.attrs.items()])
-        if self.children:
-            for c in self.children:
-                s += '\n' + str(c)
-        return s
-
-
+        # walk the subtree in preorder with an explicit stack and join all lines once
+        lines = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            lines.append(_indent(node.level))
+            lines.append(node._header())
+            lines.append('\n')
+            if isinstance(node, TagNode) and node.children:
+                stack.extend(node.children[::-1])
+        # drop the last line break
+        lines.pop()
+        return ''.join(lines)
+
+
+@cython.cclass
 class DataNode(HTMLNode):
     """Data node of HTML tree, inherited from HTMLNode class.
 
@@ -171,6 +449,8 @@ class DataNode(HTMLNode):
     closed : boolean, default True
         A data node is always closed (always True).
     """
+    __slots__ = ('data',)
+    data: str
 
     def __init__(self, data, level=0):
         super().__init__('data', level)
@@ -187,11 +467,16 @@ class DataNode(HTMLNode):
         """
         return self.data
 
+    def _header(self):
+        """Get the line of the node itself, without indentation.
+        """
+        return "<" + self.tag + "> : " + self.data
+
     def __str__(self):
-        s = '\t'*self.level + "<" + self.tag + "> : " + self.data
-        return s
+        return _indent(self.level) + self._header()
 
 
+@cython.cclass
 class HTMLTree(object):
     """HTML tree stucture.
 
@@ -201,15 +486,19 @@ class HTMLTree(object):
         The root node of the tree.
     pointer : HTMLNode object
         The node which is currently under operation.
-    path : LifoQueue
-        The path of nodes under operation, a node in the path is always the child node of the node at its previous position in the queue.
+    path : list of TagNode objects
+        The path of nodes under operation, used as a stack, a node in the path is always the child node of the node at its previous position in the list.
     """
+    root: TagNode
+    pointer: TagNode
+    path: list
 
     def __init__(self):
         self.root = TagNode('root')
-        self.path = LifoQueue()
+        self.path = []
         self.pointer = self.root
 
+    @cython.ccall
     def add_node(self, node):
         """Add a tag node to the tree.
         """
@@ -217,10 +506,11 @@ class HTMLTree(object):
         node.level = self.pointer.level + 1
         self.pointer.add_child(node)
         # add the new tag node to the path
-        self.path.put(self.pointer)
+        self.path.append(self.pointer)
         # move the pointer to the newly added node
         self.pointer = self.pointer.children[-1]
 
+    @cython.ccall
     def add_data(self, data_node):
         """Add a data node to the tree.
         """
@@ -229,6 +519,7 @@ class HTMLTree(object):
         self.pointer.add_child(data_node)
         # no need to put data node to the path, nor move the pointer downward
 
+    @cython.ccall
     def close_node(self, closing_tag):
         """Close the node currently under operation if the end tag matches.
         Parameters
@@ -239,7 +530,7 @@ class HTMLTree(object):
         if self.pointer.closed:
             raise Exception("More closing tags than starting tags.")
         self.pointer.close(closing_tag)
-        self.pointer = self.path.get()
+        self.pointer = self.path.pop()
 
     def self_close(self):
         """Close the node with brute force for some self-closed tags.
@@ -249,16 +540,16 @@ class HTMLTree(object):
         self.pointer.self_close()
         if self.pointer.tag == 'root':
             return
-        if self.path.empty():
+        if not self.path:
             raise Exception("More closing tags than starting tags.")
-        self.pointer = self.path.get()
+        self.pointer = self.path.pop()
 
-    def clean(self,
-              tags_delete=['script', 'noscript', 'style', 'aside',
-                           'header', 'footer', 'nav', 'navigation'],
-              attrs_delete=['menu', 'head', 'header', 'footer', 'foot', 'nav', 'navigation']):
+    def clean(self, tags_delete=DEFAULT_TAGS_DELETE, attrs_delete=DEFAULT_ATTRS_DELETE):
         """Clean the tree by removing nodes with tag to be deleted, or with an attribute value to be deleted.
         """
+        # build the sets once for O(1) membership tests on every node
+        tags_delete = frozenset(tags_delete)
+        attrs_delete = frozenset(attrs_delete)
         self.root.clean(tags_delete, attrs_delete)
         # TODO: remove the root node and upgrade its only child when the root node has only one child
         # if len(self.root.children) == 1:
@@ -273,51 +564,67 @@ class HTMLTree(object):
     def pure_text(self):
         """Get the pure text of the tree.
         """
-        text = self.root.pure_text()
-        text = re.sub(r'\s+', ' ', text).strip()
-        return text
+        # data fragments are already stripped and joined once by a single space, so no
+        # strip is needed, only whitespace inside the fragments is collapsed
+        return _WS.sub(' ', self.root.pure_text())
 
     def __str__(self):
         return str(self.root)
 
     @staticmethod
-    def html_to_tree(html_text):
+    def html_to_tree(html_text, use_lexbor=False):
         """Transform a raw HTML text to a tree.
 
         Paramters
         ---------
         html_text : str
             The HTML text to be transformed.
+        use_lexbor : boolean, default False
+            Whether to tokenize with selectolax's lexbor backend when it's installed. Lexbor 
+            repairs the document instead of raising on mismatched tags, and the tree always 
+            contains `html`, `head` and `body` nodes.
 
         Returns
         -------
         HTMLTree object : The HTML tree built from the HTML text.
         """
-        SELF_CLOSING_TAGS = ['img', 'area', 'base', 'br', 'col', 'command', 'embed',
-                             'hr', 'input', 'keygen', 'link', 'menuitem', 'meta', 'param', 'source', 'wbr']
-        parser = HTMLTreeParser()
-        html_text = re.sub(r'< +', '<', html_text)
-        html_text = re.sub(r'\\/', '/', html_text)
-        html_text = re.sub(r'\\"', '"', html_text)
-        parser.feed(html_text)
+        parser = TreeBuildingParser(use_lexbor)
+        parser.feed(_PREPROC.sub('', html_text))
         parser.close()
-        tree = HTMLTree()
-        for t, p in zip(parser.types, parser.members):
-            if t == 'starttag':
-                new_node = TagNode(p[0], attrs=p[1])
-                tree.add_node(new_node)
-                if p[0] in SELF_CLOSING_TAGS:
-                    tree.self_close()
-            if t == 'data':
-                data_node = DataNode(data=p)
-                tree.add_data(data_node)
-            if t == 'endtag':
-                if p not in SELF_CLOSING_TAGS:
-                    tree.close_node(p)
+        tree = parser.tree
         tree.self_close()
         tree.check_sanity()
         return tree
 
+    @staticmethod
+    def html_to_text(html_text, tags_delete=DEFAULT_TAGS_DELETE, attrs_delete=DEFAULT_ATTRS_DELETE, use_lexbor=False):
+        """Get the pure text of a raw HTML text without building a tree, same as cleaning 
+        the tree built by `html_to_tree` and getting its pure text. Like `html_to_tree`, 
+        an exception is raised if the start and end tags don't match, this check only 
+        applies to the standard library parser since lexbor repairs the document.
+
+        Paramters
+        ---------
+        html_text : str
+            The HTML text to be transformed.
+        tags_delete : iterable of str
+            The tags of nodes to be deleted.
+        attrs_delete : iterable of str
+            The `id` or `class` attribute values of nodes to be deleted.
+        use_lexbor : boolean, default False
+            Whether to tokenize with selectolax's lexbor backend when it's installed.
+
+        Returns
+        -------
+        str : The pure text of the HTML text.
+        """
+        parser = TextParser(tags_delete, attrs_delete, use_lexbor)
+        parser.feed(_PREPROC.sub('', html_text))
+        parser.close()
+        if parser.path:
+            raise Exception("Tree root node not closed.")
+        return _WS.sub(' ', ' '.join(parser.parts))
+
 
 def unit_test():
     t = "<div>This is a test text.</div>"
@@ -333,6 +640,15 @@ def unit_test():
     print('-'*10+"Tree structure:"+'-'*10+'\n', tree)
     tree.clean()
     print('-'*10+"Pure text:"+'-'*10+'\n', tree.pure_text())
+    print('-'*10+"Pure text without tree:"+'-'*10+'\n', HTMLTree.html_to_text(t))
+    print()
+    # the text got without tree must be the same as the pure text of the cleaned tree
+    for t in ["<div>This is a test text.</div>", t]:
+        for use_lexbor in (False, True):
+            tree = HTMLTree.html_to_tree(t, use_lexbor=use_lexbor)
+            tree.clean()
+            assert HTMLTree.html_to_text(t, use_lexbor=use_lexbor) == tree.pure_text()
+    print('-'*10+"Pure text without tree matches pure text of tree."+'-'*10)
 
 
 if __name__ == '__main__':
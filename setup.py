@@ -0,0 +1,20 @@
+from setuptools import setup
+
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    # without Cython the module is installed as plain Python
+    ext_modules = []
+    py_modules = ['html2tree']
+else:
+    ext_modules = cythonize(['html2tree.py'], language_level=3)
+    py_modules = []
+
+setup(
+    name='html2tree',
+    version='0.1.0',
+    description='Build a tree structure from a raw HTML text.',
+    py_modules=py_modules,
+    ext_modules=ext_modules,
+    extras_require={'lexbor': ['selectolax']},
+)